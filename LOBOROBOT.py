@@ -42,7 +42,7 @@ class PCA9685:
     self.debug = debug
     if (self.debug):
       print("Reseting PCA9685")
-    self.write(self.__MODE1, 0x00)
+    self.write(self.__MODE1, 0x20)        # register auto-increment for block writes
 
   def write(self, reg, value):
     "Writes an 8-bit value to the specified register/address"
@@ -87,6 +87,16 @@ class PCA9685:
     if (self.debug):
       print("channel: %d  LED_ON: %d LED_OFF: %d" % (channel,on,off))
 
+  def setPWMs(self, channel, pwms):
+    "Sets consecutive PWM channels, starting at channel, in one I2C transaction"
+    data = [self.__LED0_ON_L + 4*channel]
+    for on, off in pwms:
+      data += [on & 0xFF, on >> 8, off & 0xFF, off >> 8]
+    # raw I2C write, not limited to the 32-byte SMBus block size
+    self.bus.i2c_rdwr(smbus.i2c_msg.write(self.address, data))
+    if (self.debug):
+      print("channels: %d-%d  PWM: %s" % (channel, channel + len(pwms) - 1, pwms))
+
   def setDutycycle(self, channel, pulse):
     self.setPWM(channel, 0, int(pulse * (4096 / 100)))
 
@@ -163,6 +173,50 @@ class LOBOROBOT():
                 #GPIO.output(self.DIN1,1)
                 #GPIO.output(self.DIN2,0)
 
+    # 计算电机0-2各PCA9685通道的值 {通道: (on, off)}
+    def _motor_pwms(self, motor, index, speed):
+        duty = (0, int(speed * (4096 / 100)))
+        high = (0, 4095)
+        low = (0, 0)
+        forward = (index == Dir[0])
+        if(motor == 0):
+            return {self.PWMA: duty, self.AIN1: low if forward else high, self.AIN2: high if forward else low}
+        elif(motor == 1):
+            return {self.PWMB: duty, self.BIN1: high if forward else low, self.BIN2: low if forward else high}
+        elif(motor == 2):
+            return {self.PWMC: duty, self.CIN1: high if forward else low, self.CIN2: low if forward else high}
+        return {}
+
+    # 批量驱动电机，commands为[(motor, index, speed), ...]
+    # 电机0-2的连续通道合并为一次I2C写入
+    def MotorRunBulk(self, commands):
+        pwms = {}
+        for motor, index, speed in commands:
+            if speed > 100:
+                continue
+            if(motor == 3):
+                self.pwm.setPWMs(self.PWMD, [(0, int(speed * (4096 / 100)))])
+                if (index == Dir[0]):
+                    self.motorD1.off()    # DIn1设置为低电平
+                    self.motorD2.on()     # DIn2设置为高电平
+                else:
+                    self.motorD1.on()    # DIn1设置为高电平
+                    self.motorD2.off()   # DIn2设置为低电平
+            else:
+                pwms.update(self._motor_pwms(motor, index, speed))
+        if pwms:
+            channels = sorted(pwms)
+            if channels == list(range(channels[0], channels[-1] + 1)):
+                self.pwm.setPWMs(channels[0], [pwms[channel] for channel in channels])
+            else:
+                for channel in channels:
+                    self.pwm.setPWM(channel, *pwms[channel])
+
+    # 停止全部电机，只清零PWMA-PWMD占空比通道（与MotorStop相同），方向通道和舵机通道不变
+    def MotorStopAll(self):
+        for channel in (self.PWMA, self.PWMB, self.PWMC, self.PWMD):
+            self.pwm.setPWMs(channel, [(0, 0)])
+
     def MotorStop(self, motor):
         if (motor == 0):
             self.pwm.setDutycycle(self.PWMA, 0)
@@ -275,3 +329,14 @@ class LOBOROBOT():
     def set_servo_angle(self,channel,angle):
         angle=4096*((angle*11)+500)/20000
         self.pwm.setPWM(channel,0,int(angle))
+
+    # 批量设置舵机角度，连续通道合并为一次I2C写入
+    def set_servo_angles_bulk(self,channel_angles):
+        channel_angles = sorted(channel_angles)
+        channels = [channel for channel, _ in channel_angles]
+        pwms = [(0, int(4096*((angle*11)+500)/20000)) for _, angle in channel_angles]
+        if channels == list(range(channels[0], channels[0] + len(channels))):
+            self.pwm.setPWMs(channels[0], pwms)
+        else:
+            for channel, (on, off) in zip(channels, pwms):
+                self.pwm.setPWM(channel, on, off)
@@ -12,7 +12,7 @@ import time
 import json
 import threading
 import logging
-from flask import Flask, render_template, Response, request, jsonify
+from flask import Flask, render_template, Response, request
 from flask_socketio import SocketIO, emit
 
 # Import custom modules
@@ -33,11 +33,16 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = 'ai_smart_car_secret_key'
 app.config['DEBUG'] = False
 
+# BCM GPIO pin wired to the MPU6050 INT output; leave IMU_INT_PIN unset to poll the IMU
+app.config['IMU_INT_PIN'] = int(os.environ['IMU_INT_PIN']) if os.environ.get('IMU_INT_PIN') else None
+
 # Socket.IO settings
+# Threading mode matches the blocking camera/IMU/SLAM threads; an unpatched
+# eventlet hub would stall whenever those threads block in C calls
 socketio = SocketIO(
     app,
     cors_allowed_origins="*",
-    async_mode='eventlet',
+    async_mode='threading',
     ping_interval=25,
     ping_timeout=60
 )
@@ -46,7 +51,7 @@ socketio = SocketIO(
 try:
     robot = RobotController()
     camera = CameraStream(resolution=(640, 480), framerate=10)
-    imu = IMUSensor()
+    imu = IMUSensor(int_pin=app.config['IMU_INT_PIN'])
     slam = SLAMProcessor(camera, imu)
     
     # Start camera stream
@@ -74,16 +79,40 @@ system_status = {
     'battery_level': 100  # Placeholder for battery monitoring
 }
 
+# Guards system_status and its cached JSON encoding
+status_lock = threading.Lock()
+_status_json = None
+
+def status_update(**fields):
+    """Update system status fields, invalidating the cached JSON on change."""
+    global _status_json
+    with status_lock:
+        for key, value in fields.items():
+            if system_status.get(key) != value:
+                system_status[key] = value
+                _status_json = None
+
+# Rendered HTML pages; the templates have no per-request content
+_page_cache = {}
+
+def render_cached_page(template):
+    """Render a template once and serve the cached bytes afterwards."""
+    page = _page_cache.get(template)
+    if page is None:
+        page = render_template(template).encode()
+        _page_cache[template] = page
+    return Response(page, mimetype='text/html')
+
 # Routes
 @app.route('/')
 def index():
     """Render the main web interface."""
-    return render_template('index.html')
+    return render_cached_page('index.html')
 
 @app.route('/mobile')
 def mobile():
     """Render the mobile-optimized interface."""
-    return render_template('mobile.html')
+    return render_cached_page('mobile.html')
 
 @app.route('/video_feed')
 def video_feed():
@@ -96,21 +125,27 @@ def video_feed():
 @app.route('/api/status')
 def get_status():
     """API endpoint to get system status."""
-    return jsonify(system_status)
+    global _status_json
+    with status_lock:
+        # Re-encode only if the status changed since the last request
+        if _status_json is None:
+            _status_json = json.dumps(system_status).encode()
+        payload = _status_json
+    return Response(payload, mimetype='application/json')
 
 # Socket.IO event handlers
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection."""
     logger.info(f"Client connected: {request.sid}")
-    system_status['connected'] = True
+    status_update(connected=True)
     emit('status_update', system_status)
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection."""
     logger.info(f"Client disconnected: {request.sid}")
-    system_status['connected'] = False
+    status_update(connected=False)
     # Stop the robot for safety when connection is lost
     robot.stop_all_motors()
 
@@ -185,46 +220,83 @@ def handle_toggle_slam(data):
             slam.start()
         else:
             slam.stop()
-        system_status['slam_active'] = active
+        status_update(slam_active=active)
         emit('status_update', system_status)
         logger.info(f"SLAM processing {'activated' if active else 'deactivated'}")
     except Exception as e:
         logger.error(f"Error toggling SLAM: {str(e)}")
         emit('error', {'message': str(e)})
 
+@socketio.on('request_map')
+def handle_request_map():
+    """Send the current packed occupancy grid to the requesting client."""
+    try:
+        # Read the version first so a concurrent grid update is resent, never missed
+        grid_version = slam.grid_version
+        emit('map_data', {
+            'grid_version': grid_version,
+            'occupancy_packed': slam.get_occupancy_packed()
+        })
+    except Exception as e:
+        logger.error(f"Error sending map data: {str(e)}")
+        emit('error', {'message': str(e)})
+
+# Set on shutdown to stop the background task
+stop_event = threading.Event()
+
 # Background task to send sensor data and system status updates
 def background_tasks():
     """Send periodic updates to connected clients."""
-    while True:
+    last_status_sent = {}
+    last_imu_sample = None
+    last_grid_version = None
+    while not stop_event.is_set():
         if system_status['connected']:
             try:
-                # Get IMU data
-                imu_data = imu.get_data()
+                # Get IMU data only if a new sample arrived since the last tick
+                imu_sample = imu.sample_id
+                imu_data = imu.get_data() if imu_sample != last_imu_sample else None
                 
                 # Get SLAM data if active
-                slam_data = slam.get_data() if system_status['slam_active'] else None
+                slam_data = slam.get_state() if system_status['slam_active'] else None
+                
+                # Attach the packed occupancy grid only when the map changed
+                if slam_data is not None and slam_data['grid_version'] != last_grid_version:
+                    slam_data['occupancy_packed'] = slam.get_occupancy_packed()
                 
                 # Update system status
-                system_status['imu_calibrated'] = imu.is_calibrated
-                system_status['camera_active'] = camera.is_active()
+                status_update(
+                    imu_calibrated=imu.is_calibrated,
+                    camera_active=camera.is_active()
+                )
                 
-                # Send data to client
-                socketio.emit('sensor_data', {
-                    'imu': imu_data,
-                    'slam': slam_data,
-                    'timestamp': time.time()
-                })
+                # Only send the status fields that changed since the last tick
+                with status_lock:
+                    status_diff = {key: value for key, value in system_status.items()
+                                   if key not in last_status_sent or last_status_sent[key] != value}
                 
-                # Send system status update
-                socketio.emit('status_update', system_status)
+                # Send sensor data and system status in a single message,
+                # skipping the tick entirely when nothing is new
+                if imu_data is not None or slam_data is not None or status_diff:
+                    socketio.emit('tick', {
+                        'imu': imu_data,
+                        'slam': slam_data,
+                        'status': status_diff or None,
+                        'timestamp': time.time()
+                    })
+                    last_status_sent.update(status_diff)
+                    last_imu_sample = imu_sample
+                    if slam_data is not None:
+                        last_grid_version = slam_data['grid_version']
                 
             except Exception as e:
                 logger.error(f"Error in background task: {str(e)}")
         
-        # Update at 5Hz as per specifications
-        time.sleep(0.2)
+        # Update at 5Hz as per specifications (returns early on shutdown)
+        stop_event.wait(0.2)
 
-# Start background tasks in a separate thread
+# Start background tasks on a daemon thread so it can never block interpreter exit
+# (threading mode's start_background_task creates a non-daemon thread)
 background_thread = threading.Thread(target=background_tasks, daemon=True)
 background_thread.start()
 
@@ -232,6 +304,7 @@ background_thread.start()
 def cleanup():
     """Clean up resources before shutting down."""
     logger.info("Shutting down...")
+    stop_event.set()
     robot.stop_all_motors()
     camera.stop()
     imu.stop()
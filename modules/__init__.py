@@ -3,4 +3,4 @@ AI Smart Four-Wheel Drive Car - Modules Package
 This package contains the core modules for the AI Smart Car project.
 """
 
-__all__ = ['robot', 'camera', 'imu', 'slam'] 
\ No newline at end of file
+__all__ = ['robot', 'camera', 'imu', 'slam', 'jit'] 
\ No newline at end of file
@@ -12,10 +12,57 @@ import logging
 import threading
 import numpy as np
 from imutils.video import VideoStream
+from modules.jit import njit, prange, NUMBA_AVAILABLE
+
+# TurboJPEG is optional; OpenCV's encoder is used when it is not installed
+try:
+    from turbojpeg import TurboJPEG, TJSAMP_420
+except ImportError:
+    TurboJPEG = None
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# MJPEG multipart framing around each JPEG frame
+_MJPEG_PREAMBLE = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+_MJPEG_TRAILER = b'\r\n'
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _gray_sobel(bgr, gray, grad_x, grad_y):
+    """
+    Convert a BGR frame to grayscale and compute 3x3 Sobel gradients.
+    
+    Results are written into the provided buffers; borders are reflected
+    the same way as cv2.Sobel's default.
+    """
+    height, width = gray.shape
+    
+    # Grayscale conversion (BT.601 weights)
+    for y in prange(height):
+        for x in range(width):
+            lum = 0.114 * bgr[y, x, 0] + 0.587 * bgr[y, x, 1] + 0.299 * bgr[y, x, 2]
+            gray[y, x] = np.uint8(lum + 0.5)
+    
+    # Sobel x/y gradients
+    for y in prange(height):
+        ym = y - 1 if y > 0 else 1
+        yp = y + 1 if y < height - 1 else height - 2
+        for x in range(width):
+            xm = x - 1 if x > 0 else 1
+            xp = x + 1 if x < width - 1 else width - 2
+            
+            top_left = np.int16(gray[ym, xm])
+            top = np.int16(gray[ym, x])
+            top_right = np.int16(gray[ym, xp])
+            left = np.int16(gray[y, xm])
+            right = np.int16(gray[y, xp])
+            bottom_left = np.int16(gray[yp, xm])
+            bottom = np.int16(gray[yp, x])
+            bottom_right = np.int16(gray[yp, xp])
+            
+            grad_x[y, x] = (top_right + 2 * right + bottom_right) - (top_left + 2 * left + bottom_left)
+            grad_y[y, x] = (bottom_left + 2 * bottom + bottom_right) - (top_left + 2 * top + top_right)
+
 class CameraStream:
     """
     Camera streaming class that handles video capture and processing.
@@ -32,29 +79,114 @@ class CameraStream:
         self.resolution = resolution
         self.framerate = framerate
         self.stream = None
-        self.frame = None
+        self.capture = None
+        self.frame_id = 0
         self.jpeg_quality = 70  # JPEG quality (0-100)
+        self._turbojpeg = self._init_turbojpeg()
         self.is_running = False
+        self.update_thread = None
+        self._fps_changed = False  # Applied to the V4L2 capture by the capture thread
         self.lock = threading.Lock()
         
+        # Signalled by the capture thread whenever a new frame is stored
+        self.frame_ready = threading.Condition(self.lock)
+        
+        # Ping-pong frame buffers: the writer fills the inactive slot and
+        # then swaps, so readers can use the active slot without a copy
+        self._frame_bufs = self._alloc_frame_buffers()
+        self._active_buf = 0
+        self._decoded_id = 0  # ID of the frame held in the active slot
+        self._decode_lock = threading.Lock()
+        
+        # Two-slot ring of published JPEG frames; each frame is encoded once
+        # and the immutable bytes are shared by every streaming client
+        self._jpeg_slots = [None, None]
+        self._jpeg_idx = 0
+        self._stream_clients = 0
+        
         # Frame processing settings
         self.target_fps = framerate
-        self.last_frame_time = 0
         self.frame_interval = 1.0 / self.target_fps
         
         logger.info(f"Camera initialized with resolution {resolution} and target {framerate} FPS")
     
+    def _init_turbojpeg(self):
+        """
+        Load the SIMD-accelerated libjpeg-turbo encoder if available.
+        
+        Returns:
+            TurboJPEG: Encoder instance or None to fall back to OpenCV
+        """
+        if TurboJPEG is None:
+            return None
+        try:
+            encoder = TurboJPEG()
+            logger.info("Using libjpeg-turbo for JPEG encoding")
+            return encoder
+        except Exception as e:
+            logger.warning(f"libjpeg-turbo unavailable, using OpenCV encoder: {str(e)}")
+            return None
+    
+    def _alloc_frame_buffers(self):
+        """Allocate the two BGR frame buffers for the current resolution."""
+        shape = (self.resolution[1], self.resolution[0], 3)
+        return [np.empty(shape, dtype=np.uint8), np.empty(shape, dtype=np.uint8)]
+    
+    def _open_mjpeg_capture(self):
+        """
+        Open the camera through V4L2 with native MJPEG output.
+        
+        The camera hardware encodes the JPEG frames, and disabling RGB
+        conversion makes OpenCV hand back the encoded buffer untouched so
+        it can be streamed without a CPU re-encode.
+        
+        Returns:
+            cv2.VideoCapture: Opened capture or None if unavailable, not MJPEG
+                capable, or not delivering frames
+        """
+        capture = cv2.VideoCapture(0, cv2.CAP_V4L2)
+        if not capture.isOpened():
+            capture.release()
+            return None
+        
+        mjpg = cv2.VideoWriter_fourcc(*'MJPG')
+        capture.set(cv2.CAP_PROP_FOURCC, mjpg)
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
+        capture.set(cv2.CAP_PROP_FPS, self.target_fps)
+        capture.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        
+        # Make sure the driver accepted MJPEG
+        if int(capture.get(cv2.CAP_PROP_FOURCC)) != mjpg:
+            logger.info("V4L2 camera does not support MJPEG output")
+            capture.release()
+            return None
+        
+        # Some devices open but never stream (e.g. /dev/video0 with a CSI camera)
+        ret, buf = capture.read()
+        if not ret or buf is None:
+            logger.info("V4L2 camera opened but delivered no frames")
+            capture.release()
+            return None
+        
+        return capture
+    
     def start(self):
         """Start the camera stream."""
         try:
-            # Try to use the Raspberry Pi camera first
-            try:
-                self.stream = VideoStream(usePiCamera=True, resolution=self.resolution).start()
-                logger.info("Using Raspberry Pi Camera")
-            except:
-                # Fall back to USB camera
-                self.stream = VideoStream(src=0, resolution=self.resolution).start()
-                logger.info("Using USB Camera")
+            # Prefer a V4L2 camera that delivers hardware-encoded MJPEG
+            self.capture = self._open_mjpeg_capture()
+            if self.capture is not None:
+                logger.info("Using V4L2 camera with MJPEG output")
+            else:
+                # Try to use the Raspberry Pi camera next
+                try:
+                    self.stream = VideoStream(usePiCamera=True, resolution=self.resolution).start()
+                    logger.info("Using Raspberry Pi Camera")
+                except:
+                    # Fall back to USB camera
+                    self.stream = VideoStream(src=0, resolution=self.resolution).start()
+                    logger.info("Using USB Camera")
             
             # Wait for camera to warm up
             time.sleep(2.0)
@@ -74,48 +206,205 @@ class CameraStream:
     def stop(self):
         """Stop the camera stream."""
         self.is_running = False
+        
+        # Wake up any stream generators waiting for a frame
+        with self.frame_ready:
+            self.frame_ready.notify_all()
+        
+        # Wait for the capture thread to leave its read; it owns the V4L2
+        # capture and releases it on exit, since VideoCapture is not thread-safe
+        if self.update_thread is not None and self.update_thread is not threading.current_thread():
+            self.update_thread.join(timeout=3.0)
+            if self.update_thread.is_alive():
+                logger.warning("Camera thread still blocked in read; capture will be released when it returns")
+        self.update_thread = None
+        
+        if self.capture is not None:
+            self.capture = None
+            logger.info("Camera stream stopped")
         if self.stream is not None:
             self.stream.stop()
             logger.info("Camera stream stopped")
     
     def _update_frame(self):
         """Background thread to update the current frame."""
-        while self.is_running:
+        # The V4L2 capture is only touched from this thread; stop() detaches it
+        # from self.capture and this thread releases it after its last read
+        capture = self.capture
+        read_failed = False
+        while self.is_running and self.capture is capture:
             try:
-                # Throttle frame capture to target FPS
-                current_time = time.time()
-                if (current_time - self.last_frame_time) >= self.frame_interval:
-                    # Get frame from camera
-                    frame = self.stream.read()
-                    
-                    # Process frame if valid
+                # Apply framerate changes here rather than from the caller's thread
+                if self._fps_changed and capture is not None:
+                    self._fps_changed = False
+                    capture.set(cv2.CAP_PROP_FPS, self.target_fps)
+                
+                # Get frame from camera; V4L2 reads block until the driver
+                # delivers the next frame at the configured FPS
+                frame, jpeg_frame = self._read_frame(capture)
+                
+                # Process frame if valid
+                if frame is not None or jpeg_frame is not None:
+                    # Write BGR frames into the inactive buffer slot
                     if frame is not None:
-                        # Resize if needed
-                        if frame.shape[1] != self.resolution[0] or frame.shape[0] != self.resolution[1]:
-                            frame = cv2.resize(frame, self.resolution)
+                        dst = self._frame_bufs[1 - self._active_buf]
+                        self._fit_resolution(frame, dst)
                         
-                        # Store the frame with thread safety
-                        with self.lock:
-                            self.frame = frame
-                            self.last_frame_time = current_time
+                        # Encode once here while anyone is streaming
+                        if self._stream_clients > 0:
+                            jpeg_frame = self._encode_jpeg(dst)
+                    
+                    # Fill the inactive JPEG slot (single writer)
+                    self._jpeg_slots[self._jpeg_idx ^ 1] = jpeg_frame
+                    
+                    # Publish the frame with thread safety; MJPEG frames
+                    # are decoded lazily by get_frame()
+                    with self.frame_ready:
+                        if frame is not None:
+                            self._active_buf ^= 1
+                        self._jpeg_idx ^= 1
+                        self.frame_id += 1
+                        if frame is not None:
+                            self._decoded_id = self.frame_id
+                        self.frame_ready.notify_all()
+                    read_failed = False
+                else:
+                    # Failed reads return immediately, so back off instead of spinning
+                    if not read_failed:
+                        logger.warning("Failed to read camera frame, retrying")
+                        read_failed = True
+                    time.sleep(self.frame_interval)
+                    continue
                 
-                # Small sleep to prevent CPU overuse
-                time.sleep(0.01)
+                # VideoStream reads return immediately, so throttle to target FPS
+                if capture is None:
+                    time.sleep(self.frame_interval)
             except Exception as e:
                 logger.error(f"Error updating camera frame: {str(e)}")
                 time.sleep(0.1)  # Sleep longer on error
+        
+        if capture is not None:
+            capture.release()
+    
+    def _read_frame(self, capture):
+        """
+        Read the next frame from the active camera source.
+        
+        Args:
+            capture (cv2.VideoCapture): V4L2 capture, or None to read the VideoStream
+        
+        Returns:
+            tuple: (BGR frame, JPEG bytes) - JPEG bytes are only set when the
+                camera delivered hardware-encoded MJPEG
+        """
+        if capture is None:
+            return self.stream.read(), None
+        
+        ret, buf = capture.read()
+        if not ret or buf is None:
+            return None, None
+        
+        # Raw MJPEG comes back as a single row of encoded bytes
+        if buf.ndim < 3 or buf.shape[0] == 1:
+            return None, buf.tobytes()
+        
+        # Camera did not honour the MJPEG request; treat as a BGR frame
+        return buf, None
+    
+    def _fit_resolution(self, frame, dst):
+        """Copy a frame into dst, resizing to the configured resolution if needed."""
+        if frame.shape[1] != self.resolution[0] or frame.shape[0] != self.resolution[1]:
+            # Resize straight into the preallocated buffer
+            cv2.resize(frame, self.resolution, dst=dst, interpolation=cv2.INTER_AREA)
+        else:
+            np.copyto(dst, frame)
     
     def get_frame(self):
         """
         Get the current frame.
         
+        The returned array is a view of the active frame buffer, not a copy.
+        It is only guaranteed valid until the next frame is published: the
+        capture thread starts overwriting that slot while it captures the
+        frame after that. Callers must finish with it (or copy it) promptly.
+        
+        MJPEG frames are only decoded here, the first time a consumer asks
+        for pixels, and the result is kept until the next frame arrives.
+        
         Returns:
             numpy.ndarray: Current camera frame or None if not available
         """
         with self.lock:
-            if self.frame is not None:
-                return self.frame.copy()
+            if self.frame_id == 0:
+                return None
+            if self._decoded_id == self.frame_id:
+                return self._frame_bufs[self._active_buf]
+        
+        # Serialize decoding so concurrent readers do not share the inactive slot
+        with self._decode_lock:
+            with self.lock:
+                if self._decoded_id == self.frame_id:
+                    return self._frame_bufs[self._active_buf]
+                jpeg_frame = self._jpeg_slots[self._jpeg_idx]
+                frame_id = self.frame_id
+            
+            if jpeg_frame is None:
+                return None
+            
+            # Decode outside the lock so the capture thread is not blocked
+            frame = cv2.imdecode(np.frombuffer(jpeg_frame, np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                return None
+            if frame.shape[1] != self.resolution[0] or frame.shape[0] != self.resolution[1]:
+                # Only the capture thread writes BGR frames, and it never
+                # does while frames arrive as MJPEG, so the slot is free
+                frame = cv2.resize(frame, self.resolution, dst=self._frame_bufs[1 - self._active_buf],
+                                   interpolation=cv2.INTER_AREA)
+            
+            # Memoize the decoded frame unless a newer one has arrived meanwhile
+            with self.lock:
+                if self.frame_id == frame_id:
+                    self._frame_bufs[1 - self._active_buf] = frame
+                    self._active_buf ^= 1
+                    self._decoded_id = frame_id
+            return frame
+    
+    def get_frame_grayscale_gradient(self, gray=None, grad_x=None, grad_y=None):
+        """
+        Get the current frame as grayscale plus Sobel x/y gradients.
+        
+        With Numba available the conversion and both gradients are computed
+        in one fused parallel kernel; otherwise OpenCV is used. Passing
+        preallocated buffers avoids any per-call allocation.
+        
+        Args:
+            gray (numpy.ndarray): Optional uint8 (height, width) output buffer
+            grad_x (numpy.ndarray): Optional int16 (height, width) output buffer
+            grad_y (numpy.ndarray): Optional int16 (height, width) output buffer
+        
+        Returns:
+            tuple: (gray, grad_x, grad_y) or None if no frame is available
+        """
+        frame = self.get_frame()
+        if frame is None:
             return None
+        
+        shape = frame.shape[:2]
+        if gray is None:
+            gray = np.empty(shape, dtype=np.uint8)
+        if grad_x is None:
+            grad_x = np.empty(shape, dtype=np.int16)
+        if grad_y is None:
+            grad_y = np.empty(shape, dtype=np.int16)
+        
+        if NUMBA_AVAILABLE:
+            _gray_sobel(frame, gray, grad_x, grad_y)
+        else:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+            cv2.Sobel(gray, cv2.CV_16S, 1, 0, dst=grad_x, ksize=3)
+            cv2.Sobel(gray, cv2.CV_16S, 0, 1, dst=grad_y, ksize=3)
+        
+        return gray, grad_x, grad_y
     
     def get_jpeg_frame(self):
         """
@@ -124,17 +413,55 @@ class CameraStream:
         Returns:
             bytes: JPEG encoded frame or None if not available
         """
+        # Use the published JPEG when available
+        with self.lock:
+            jpeg_frame = self._jpeg_slots[self._jpeg_idx]
+        if jpeg_frame is not None:
+            return jpeg_frame
+        
         frame = self.get_frame()
         if frame is not None:
-            try:
-                # Encode frame as JPEG
-                ret, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
-                if ret:
-                    return jpeg.tobytes()
-            except Exception as e:
-                logger.error(f"Error encoding JPEG: {str(e)}")
+            return self._encode_jpeg(frame)
         return None
     
+    def _encode_jpeg(self, frame):
+        """
+        Encode a BGR frame as JPEG.
+        
+        Args:
+            frame (numpy.ndarray): Frame to encode
+        
+        Returns:
+            bytes: JPEG encoded frame or None on failure
+        """
+        try:
+            if self._turbojpeg is not None:
+                return self._turbojpeg.encode(frame, quality=self.jpeg_quality, jpeg_subsample=TJSAMP_420)
+            ret, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if ret:
+                return jpeg.tobytes()
+        except Exception as e:
+            logger.error(f"Error encoding JPEG: {str(e)}")
+        return None
+    
+    def wait_for_frame(self, last_frame_id, timeout=1.0):
+        """
+        Block until a frame newer than last_frame_id is available.
+        
+        Args:
+            last_frame_id (int): ID of the last frame the caller has seen
+            timeout (float): Maximum time to wait in seconds
+        
+        Returns:
+            int: Current frame ID (equal to last_frame_id on timeout or stop)
+        """
+        with self.frame_ready:
+            self.frame_ready.wait_for(
+                lambda: self.frame_id != last_frame_id or not self.is_running,
+                timeout=timeout
+            )
+            return self.frame_id
+    
     def generate_frames(self):
         """
         Generator function for streaming frames via HTTP.
@@ -142,17 +469,36 @@ class CameraStream:
         Yields:
             bytes: MJPEG frame data for streaming
         """
-        while self.is_running:
-            # Get JPEG encoded frame
-            jpeg_frame = self.get_jpeg_frame()
-            
-            if jpeg_frame is not None:
-                # Yield the frame in MJPEG format
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + jpeg_frame + b'\r\n')
-            else:
-                # If no frame is available, yield an empty frame
-                time.sleep(0.1)
+        with self.lock:
+            self._stream_clients += 1
+        
+        try:
+            last_frame_id = 0
+            while self.is_running:
+                # Wait for the capture thread to publish a new frame
+                with self.frame_ready:
+                    self.frame_ready.wait_for(
+                        lambda: self.frame_id != last_frame_id or not self.is_running,
+                        timeout=1.0
+                    )
+                    if self.frame_id == last_frame_id:
+                        continue
+                    last_frame_id = self.frame_id
+                    jpeg_frame = self._jpeg_slots[self._jpeg_idx]
+                
+                # Encode on demand if the frame was published before we streamed
+                if jpeg_frame is None:
+                    jpeg_frame = self.get_jpeg_frame()
+                
+                if jpeg_frame is not None:
+                    # Yield the frame in MJPEG format as separate chunks so
+                    # the JPEG bytes are never copied into a new object
+                    yield _MJPEG_PREAMBLE
+                    yield jpeg_frame
+                    yield _MJPEG_TRAILER
+        finally:
+            with self.lock:
+                self._stream_clients -= 1
     
     def is_active(self):
         """
@@ -161,7 +507,7 @@ class CameraStream:
         Returns:
             bool: True if camera is running, False otherwise
         """
-        return self.is_running and self.stream is not None
+        return self.is_running and (self.stream is not None or self.capture is not None)
     
     def set_resolution(self, width, height):
         """
@@ -175,15 +521,18 @@ class CameraStream:
             bool: True if successful, False otherwise
         """
         try:
-            # Store new resolution
-            self.resolution = (width, height)
-            
             # Restart the camera with new resolution
             was_running = self.is_running
             if was_running:
                 self.stop()
                 time.sleep(0.5)
             
+            # Store new resolution and reallocate the frame buffers
+            with self.lock:
+                self.resolution = (width, height)
+                self._frame_bufs = self._alloc_frame_buffers()
+                self._decoded_id = 0
+            
             if was_running:
                 self.start()
             
@@ -203,6 +552,8 @@ class CameraStream:
         if fps > 0:
             self.target_fps = fps
             self.frame_interval = 1.0 / self.target_fps
+            # The capture thread applies the new rate to the V4L2 device
+            self._fps_changed = True
             logger.info(f"Target framerate set to {fps} FPS")
     
     def set_jpeg_quality(self, quality):
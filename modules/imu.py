@@ -8,14 +8,38 @@ This module handles the MPU6050 IMU sensor for motion tracking.
 
 import time
 import math
+import struct
+import ctypes
 import logging
 import threading
 import numpy as np
 import smbus2 as smbus
+from gpiozero import DigitalInputDevice
+from modules.jit import njit, NUMBA_AVAILABLE
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Radians to degrees conversion factor
+RAD_TO_DEG = 180.0 / math.pi
+
+@njit(cache=True, fastmath=True)
+def _roll_pitch(accel_x, accel_y, accel_z):
+    """Compute roll and pitch in degrees from accelerometer readings."""
+    # Roll (rotation around X-axis)
+    roll = math.atan2(accel_y, math.hypot(accel_x, accel_z)) * RAD_TO_DEG
+    
+    # Pitch (rotation around Y-axis)
+    pitch = math.atan2(-accel_x, math.hypot(accel_y, accel_z)) * RAD_TO_DEG
+    
+    return roll, pitch
+
+@njit(cache=True, fastmath=True)
+def _apply_calibration(raw, inv_scales, bias, out):
+    """Scale raw readings and subtract bias, writing into out."""
+    for i in range(raw.shape[0]):
+        out[i] = raw[i] * inv_scales[i] - bias[i]
+
 class IMUSensor:
     """
     MPU6050 IMU sensor interface for motion tracking.
@@ -28,7 +52,9 @@ class IMUSensor:
     CONFIG = 0x1A
     GYRO_CONFIG = 0x1B
     ACCEL_CONFIG = 0x1C
+    INT_PIN_CFG = 0x37
     INT_ENABLE = 0x38
+    INT_STATUS = 0x3A
     ACCEL_XOUT_H = 0x3B
     ACCEL_YOUT_H = 0x3D
     ACCEL_ZOUT_H = 0x3F
@@ -36,25 +62,51 @@ class IMUSensor:
     GYRO_YOUT_H = 0x45
     GYRO_ZOUT_H = 0x47
     
-    def __init__(self):
-        """Initialize the IMU sensor."""
+    def __init__(self, int_pin=None):
+        """
+        Initialize the IMU sensor.
+        
+        Args:
+            int_pin (int): BCM GPIO pin wired to the MPU6050 INT output.
+                When None, the sensor is polled at a fixed interval instead.
+        """
         self.bus = None
+        self.int_pin = int_pin
+        self.data_ready = None
         self.is_running = False
         self.is_calibrated = False
         self.lock = threading.Lock()
         
-        # Sensor data
-        self.accel_data = {'x': 0, 'y': 0, 'z': 0}
-        self.gyro_data = {'x': 0, 'y': 0, 'z': 0}
-        self.temp_data = 0
+        # Sensor data stored contiguously as [ax, ay, az, gx, gy, gz, temp];
+        # accel and gyro are (x, y, z) views into it
+        self._state = np.zeros(7, dtype=np.float32)
+        self.accel = self._state[0:3]
+        self.gyro = self._state[3:6]
+        
+        # Incremented on every new sample so consumers can skip stale data
+        self.sample_id = 0
         
-        # Calibration values
-        self.accel_bias = {'x': 0, 'y': 0, 'z': 0}
-        self.gyro_bias = {'x': 0, 'y': 0, 'z': 0}
+        # Calibration values [ax, ay, az, gx, gy, gz]; accel_bias and
+        # gyro_bias are (x, y, z) views into it
+        self._bias = np.zeros(6, dtype=np.float32)
+        self.accel_bias = self._bias[0:3]
+        self.gyro_bias = self._bias[3:6]
         
         # Conversion factors
         self.accel_scale = 16384.0  # for ±2g range
         self.gyro_scale = 131.0     # for ±250°/s range
+        self._inv_scales = np.array([1.0 / self.accel_scale] * 3 + [1.0 / self.gyro_scale] * 3,
+                                    dtype=np.float32)
+        
+        # Raw accelerometer and gyroscope readings of the latest sample
+        self._raw = np.zeros(6, dtype=np.int32)
+        
+        # Reusable I2C messages and receive buffer for block reads
+        self._reg_msg = smbus.i2c_msg.write(self.MPU6050_ADDR, [self.ACCEL_XOUT_H])
+        self._data_msg = smbus.i2c_msg.read(self.MPU6050_ADDR, 14)
+        self._rx = bytearray(14)
+        self._rx_view = (ctypes.c_char * 14).from_buffer(self._rx)
+        self._unpack_raw = struct.Struct('>hhhhhhh').unpack_from
         
         # Initialize the sensor
         try:
@@ -64,6 +116,15 @@ class IMUSensor:
         except Exception as e:
             logger.error(f"Failed to initialize MPU6050: {str(e)}")
             self.bus = None
+        
+        # Use the data ready interrupt to pace reads if the INT pin is wired
+        if self.bus is not None and int_pin is not None:
+            try:
+                self.data_ready = DigitalInputDevice(int_pin, pull_up=False)
+                logger.info(f"Using MPU6050 data ready interrupt on GPIO{int_pin}")
+            except Exception as e:
+                logger.warning(f"Data ready interrupt unavailable, polling instead: {str(e)}")
+                self.data_ready = None
     
     def _initialize_sensor(self):
         """Initialize the MPU6050 sensor."""
@@ -74,8 +135,10 @@ class IMUSensor:
             # Wake up the MPU6050
             self.bus.write_byte_data(self.MPU6050_ADDR, self.PWR_MGMT_1, 0)
             
-            # Set sample rate to 50Hz
-            self.bus.write_byte_data(self.MPU6050_ADDR, self.SMPLRT_DIV, 19)
+            # Set sample rate to 50Hz, or 20Hz when each data ready interrupt
+            # triggers a read, so interrupt pacing keeps the 20Hz read rate
+            sample_div = 49 if self.int_pin is not None else 19
+            self.bus.write_byte_data(self.MPU6050_ADDR, self.SMPLRT_DIV, sample_div)
             
             # Set DLPF to 21Hz (bandwidth)
             self.bus.write_byte_data(self.MPU6050_ADDR, self.CONFIG, 4)
@@ -86,25 +149,34 @@ class IMUSensor:
             # Set accelerometer range to ±2g
             self.bus.write_byte_data(self.MPU6050_ADDR, self.ACCEL_CONFIG, 0)
             
+            # Latch INT high until the next register read clears it
+            self.bus.write_byte_data(self.MPU6050_ADDR, self.INT_PIN_CFG, 0x30)
+            
             # Enable data ready interrupt
             self.bus.write_byte_data(self.MPU6050_ADDR, self.INT_ENABLE, 1)
             
+            # Clear any pending interrupt
+            self.bus.read_byte_data(self.MPU6050_ADDR, self.INT_STATUS)
+            
             return True
         except Exception as e:
             logger.error(f"Error initializing MPU6050: {str(e)}")
             return False
     
-    def _read_word(self, reg):
-        """Read a word from the sensor."""
-        high = self.bus.read_byte_data(self.MPU6050_ADDR, reg)
-        low = self.bus.read_byte_data(self.MPU6050_ADDR, reg + 1)
-        value = (high << 8) + low
+    def _read_all_raw(self):
+        """
+        Read all raw sensor registers in a single I2C block transfer.
         
-        # Convert to signed value
-        if value >= 0x8000:
-            value = -((65535 - value) + 1)
-            
-        return value
+        The accelerometer, temperature and gyroscope registers are
+        contiguous (0x3B-0x48), so one 14-byte read replaces seven
+        separate word reads.
+        
+        Returns:
+            tuple: Signed raw values (accel_x, accel_y, accel_z, temp, gyro_x, gyro_y, gyro_z)
+        """
+        self.bus.i2c_rdwr(self._reg_msg, self._data_msg)
+        ctypes.memmove(self._rx_view, self._data_msg.buf, 14)
+        return self._unpack_raw(self._rx)
     
     def _read_sensor_data(self):
         """Read raw sensor data from MPU6050."""
@@ -112,34 +184,27 @@ class IMUSensor:
             return False
         
         try:
-            # Read accelerometer data
-            accel_x = self._read_word(self.ACCEL_XOUT_H)
-            accel_y = self._read_word(self.ACCEL_YOUT_H)
-            accel_z = self._read_word(self.ACCEL_ZOUT_H)
+            # Read accelerometer, temperature and gyroscope data in one transfer
+            accel_x, accel_y, accel_z, temp, gyro_x, gyro_y, gyro_z = self._read_all_raw()
             
-            # Read gyroscope data
-            gyro_x = self._read_word(self.GYRO_XOUT_H)
-            gyro_y = self._read_word(self.GYRO_YOUT_H)
-            gyro_z = self._read_word(self.GYRO_ZOUT_H)
+            # Convert temperature to Celsius
+            temp = (temp / 340.0) + 36.53
             
-            # Read temperature data
-            temp = self._read_word(0x41)
-            temp = (temp / 340.0) + 36.53  # Convert to Celsius
+            self._raw[:] = (accel_x, accel_y, accel_z, gyro_x, gyro_y, gyro_z)
             
             # Apply calibration and scaling
             with self.lock:
-                # Accelerometer (convert to g)
-                self.accel_data['x'] = (accel_x / self.accel_scale) - self.accel_bias['x']
-                self.accel_data['y'] = (accel_y / self.accel_scale) - self.accel_bias['y']
-                self.accel_data['z'] = (accel_z / self.accel_scale) - self.accel_bias['z']
-                
-                # Gyroscope (convert to degrees per second)
-                self.gyro_data['x'] = (gyro_x / self.gyro_scale) - self.gyro_bias['x']
-                self.gyro_data['y'] = (gyro_y / self.gyro_scale) - self.gyro_bias['y']
-                self.gyro_data['z'] = (gyro_z / self.gyro_scale) - self.gyro_bias['z']
+                # Accelerometer (convert to g) and gyroscope (convert to
+                # degrees per second) in one pass
+                if NUMBA_AVAILABLE:
+                    _apply_calibration(self._raw, self._inv_scales, self._bias, self._state)
+                else:
+                    np.subtract(self._raw * self._inv_scales, self._bias, out=self._state[:6])
                 
                 # Temperature
-                self.temp_data = temp
+                self._state[6] = temp
+                
+                self.sample_id += 1
             
             return True
         except Exception as e:
@@ -163,52 +228,36 @@ class IMUSensor:
             # Number of samples for calibration
             num_samples = 50
             
-            # Temporary storage for calibration data
-            accel_x_sum = 0
-            accel_y_sum = 0
-            accel_z_sum = 0
-            gyro_x_sum = 0
-            gyro_y_sum = 0
-            gyro_z_sum = 0
+            # Raw samples, one row per reading: accel x/y/z, gyro x/y/z
+            raw = np.empty((num_samples, 6), dtype=np.int32)
             
             # Collect calibration samples
-            for _ in range(num_samples):
+            for i in range(num_samples):
                 # Read raw sensor data
-                accel_x = self._read_word(self.ACCEL_XOUT_H) / self.accel_scale
-                accel_y = self._read_word(self.ACCEL_YOUT_H) / self.accel_scale
-                accel_z = self._read_word(self.ACCEL_ZOUT_H) / self.accel_scale
-                gyro_x = self._read_word(self.GYRO_XOUT_H) / self.gyro_scale
-                gyro_y = self._read_word(self.GYRO_YOUT_H) / self.gyro_scale
-                gyro_z = self._read_word(self.GYRO_ZOUT_H) / self.gyro_scale
-                
-                # Accumulate values
-                accel_x_sum += accel_x
-                accel_y_sum += accel_y
-                accel_z_sum += accel_z
-                gyro_x_sum += gyro_x
-                gyro_y_sum += gyro_y
-                gyro_z_sum += gyro_z
+                ax, ay, az, _, gx, gy, gz = self._read_all_raw()
+                raw[i] = (ax, ay, az, gx, gy, gz)
                 
                 # Small delay between samples
                 time.sleep(0.05)
             
+            # Average all samples at once and convert to g / degrees per second
+            means = raw.mean(axis=0)
+            means[:3] /= self.accel_scale
+            means[3:] /= self.gyro_scale
+            
+            # Accelerometer bias (subtract 1g from z-axis due to gravity)
+            means[2] -= 1.0
+            
             # Calculate average bias values
             with self.lock:
-                # Accelerometer bias (subtract 1g from z-axis due to gravity)
-                self.accel_bias['x'] = accel_x_sum / num_samples
-                self.accel_bias['y'] = accel_y_sum / num_samples
-                self.accel_bias['z'] = (accel_z_sum / num_samples) - 1.0  # Subtract 1g
-                
-                # Gyroscope bias
-                self.gyro_bias['x'] = gyro_x_sum / num_samples
-                self.gyro_bias['y'] = gyro_y_sum / num_samples
-                self.gyro_bias['z'] = gyro_z_sum / num_samples
+                self.accel_bias[:] = means[:3]
+                self.gyro_bias[:] = means[3:]
                 
                 self.is_calibrated = True
             
             logger.info("IMU calibration completed successfully")
-            logger.debug(f"Accel bias: {self.accel_bias}")
-            logger.debug(f"Gyro bias: {self.gyro_bias}")
+            logger.debug(f"Accel bias: {self.accel_bias.tolist()}")
+            logger.debug(f"Gyro bias: {self.gyro_bias.tolist()}")
             
             return True
         except Exception as e:
@@ -243,11 +292,15 @@ class IMUSensor:
         """Background thread to update IMU data."""
         while self.is_running:
             try:
-                # Read sensor data
+                # Read sensor data (this also clears the latched interrupt)
                 self._read_sensor_data()
                 
-                # Update at 20Hz (50ms interval) as per specifications
-                time.sleep(0.05)
+                if self.data_ready is not None:
+                    # Sleep until the sensor signals the next sample
+                    self.data_ready.wait_for_active(timeout=0.1)
+                else:
+                    # Update at 20Hz (50ms interval) as per specifications
+                    time.sleep(0.05)
             except Exception as e:
                 logger.error(f"Error updating IMU data: {str(e)}")
                 time.sleep(0.1)  # Sleep longer on error
@@ -259,13 +312,18 @@ class IMUSensor:
         Returns:
             dict: Dictionary containing accelerometer and gyroscope data
         """
+        # Snapshot the state under the lock, build the dict outside it
         with self.lock:
-            return {
-                'accelerometer': self.accel_data.copy(),
-                'gyroscope': self.gyro_data.copy(),
-                'temperature': self.temp_data,
-                'calibrated': self.is_calibrated
-            }
+            snap = self._state.copy()
+            calibrated = self.is_calibrated
+        
+        ax, ay, az, gx, gy, gz, temp = snap.tolist()
+        return {
+            'accelerometer': {'x': ax, 'y': ay, 'z': az},
+            'gyroscope': {'x': gx, 'y': gy, 'z': gz},
+            'temperature': temp,
+            'calibrated': calibrated
+        }
     
     def get_orientation(self):
         """
@@ -274,19 +332,14 @@ class IMUSensor:
         Returns:
             dict: Roll and pitch angles in degrees
         """
+        # Only hold the lock while reading the accelerometer values
         with self.lock:
-            # Calculate roll and pitch from accelerometer data
-            accel_x = self.accel_data['x']
-            accel_y = self.accel_data['y']
-            accel_z = self.accel_data['z']
-            
-            # Calculate roll (rotation around X-axis)
-            roll = math.atan2(accel_y, math.sqrt(accel_x**2 + accel_z**2)) * 180.0 / math.pi
-            
-            # Calculate pitch (rotation around Y-axis)
-            pitch = math.atan2(-accel_x, math.sqrt(accel_y**2 + accel_z**2)) * 180.0 / math.pi
-            
-            return {
-                'roll': roll,
-                'pitch': pitch
-            } 
\ No newline at end of file
+            accel_x, accel_y, accel_z = self.accel.tolist()
+        
+        # Calculate roll and pitch from accelerometer data
+        roll, pitch = _roll_pitch(accel_x, accel_y, accel_z)
+        
+        return {
+            'roll': roll,
+            'pitch': pitch
+        } 
\ No newline at end of file
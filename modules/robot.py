@@ -34,6 +34,12 @@ class RobotController:
             self.pan_angle = 80  # Initial horizontal servo angle (PWM9)
             self.tilt_angle = 40  # Initial vertical servo angle (PWM10)
             
+            # Servo write filtering to avoid flooding the I2C bus
+            self.servo_deadband = 0.05  # Ignore joystick values smaller than this
+            self.servo_min_interval = 0.02  # Minimum seconds between writes per servo
+            self._last_pan_write = 0.0
+            self._last_tilt_write = 0.0
+            
             # Set initial servo positions
             self.center_camera()
             
@@ -41,6 +47,9 @@ class RobotController:
             self.motor_speeds = [0, 0, 0, 0]  # Speed of each motor
             self.motor_directions = ['forward', 'forward', 'forward', 'forward']  # Direction of each motor
             
+            # Immutable state snapshots, replaced atomically so getters need no lock
+            self._motor_snapshot = (tuple(self.motor_speeds), tuple(self.motor_directions))
+            
         except Exception as e:
             logger.error(f"Failed to initialize robot controller: {str(e)}")
             raise
@@ -61,86 +70,80 @@ class RobotController:
             max_speed (int): Maximum motor speed (0-100)
             turning_factor (float): Speed reduction factor when turning
         """
+        # Stop if no input
+        if x == 0 and y == 0:
+            self.stop_all_motors()
+            return
+        
+        # Calculate base speed from y input (forward/backward)
+        base_speed = abs(y) * max_speed
+        
+        # Determine forward or backward direction
+        direction = 'forward' if y >= 0 else 'backward'
+        
+        # Calculate left and right motor speeds for differential steering
+        left_speed = base_speed
+        right_speed = base_speed
+        
+        # Apply turning based on x input
+        if x != 0:
+            # Reduce overall speed when turning
+            left_speed *= turning_factor
+            right_speed *= turning_factor
+            
+            # Differential steering calculation
+            if x > 0:  # Turn right
+                left_speed += (x * max_speed * 0.5)
+                right_speed -= (x * max_speed * 0.5)
+            else:  # Turn left
+                left_speed -= (abs(x) * max_speed * 0.5)
+                right_speed += (abs(x) * max_speed * 0.5)
+        
+        # Ensure speeds are within valid range
+        left_speed = int(max(0, min(max_speed, left_speed)))
+        right_speed = int(max(0, min(max_speed, right_speed)))
+        turn_speed = int(max_speed * 0.7)
+        
+        # Left motors (0, 2) and right motors (1, 3) are set together
+        commands = [
+            (0, direction, left_speed),
+            (2, direction, left_speed),
+            (1, direction, right_speed),
+            (3, direction, right_speed)
+        ]
+        
+        # Only the I2C writes and the state update need the lock
         self._ensure_lock_exists()
         with self.lock:
-            # Stop if no input
-            if x == 0 and y == 0:
-                self.stop_all_motors()
-                return
-            
-            # Calculate base speed from y input (forward/backward)
-            base_speed = abs(y) * max_speed
-            
-            # Determine forward or backward direction
-            direction = 'forward' if y >= 0 else 'backward'
-            
-            # Calculate left and right motor speeds for differential steering
-            left_speed = base_speed
-            right_speed = base_speed
-            
-            # Apply turning based on x input
-            if x != 0:
-                # Reduce overall speed when turning
-                left_speed *= turning_factor
-                right_speed *= turning_factor
-                
-                # Differential steering calculation
-                if x > 0:  # Turn right
-                    left_speed += (x * max_speed * 0.5)
-                    right_speed -= (x * max_speed * 0.5)
-                else:  # Turn left
-                    left_speed -= (abs(x) * max_speed * 0.5)
-                    right_speed += (abs(x) * max_speed * 0.5)
-            
-            # Ensure speeds are within valid range
-            left_speed = max(0, min(max_speed, left_speed))
-            right_speed = max(0, min(max_speed, right_speed))
-            
             # Determine individual motor directions and speeds
-            if direction == 'forward':
-                if x > 0.7:  # Sharp right turn
-                    self.robot.turnRight(int(max_speed * 0.7), 0.1)
-                elif x < -0.7:  # Sharp left turn
-                    self.robot.turnLeft(int(max_speed * 0.7), 0.1)
-                else:
-                    # Set left motors (0, 2)
-                    self.robot.MotorRun(0, direction, int(left_speed))
-                    self.robot.MotorRun(2, direction, int(left_speed))
-                    
-                    # Set right motors (1, 3)
-                    self.robot.MotorRun(1, direction, int(right_speed))
-                    self.robot.MotorRun(3, direction, int(right_speed))
-            else:  # backward
-                if x > 0.7:  # Sharp right turn backward
-                    self.robot.turnRight(int(max_speed * 0.7), 0.1)
-                    self.robot.t_down(int(max_speed * 0.7), 0.1)
-                elif x < -0.7:  # Sharp left turn backward
-                    self.robot.turnLeft(int(max_speed * 0.7), 0.1)
-                    self.robot.t_down(int(max_speed * 0.7), 0.1)
-                else:
-                    # Set left motors (0, 2)
-                    self.robot.MotorRun(0, direction, int(left_speed))
-                    self.robot.MotorRun(2, direction, int(left_speed))
-                    
-                    # Set right motors (1, 3)
-                    self.robot.MotorRun(1, direction, int(right_speed))
-                    self.robot.MotorRun(3, direction, int(right_speed))
+            if x > 0.7:  # Sharp right turn
+                self.robot.turnRight(turn_speed, 0.1)
+                if direction == 'backward':
+                    self.robot.t_down(turn_speed, 0.1)
+            elif x < -0.7:  # Sharp left turn
+                self.robot.turnLeft(turn_speed, 0.1)
+                if direction == 'backward':
+                    self.robot.t_down(turn_speed, 0.1)
+            else:
+                self.robot.MotorRunBulk(commands)
             
             # Update motor state
-            self.motor_speeds = [int(left_speed), int(right_speed), int(left_speed), int(right_speed)]
+            self.motor_speeds = [left_speed, right_speed, left_speed, right_speed]
             self.motor_directions = [direction, direction, direction, direction]
-            
-            logger.debug(f"Motors set: L={left_speed}, R={right_speed}, dir={direction}")
+            self._motor_snapshot = (tuple(self.motor_speeds), tuple(self.motor_directions))
+        
+        logger.debug(f"Motors set: L={left_speed}, R={right_speed}, dir={direction}")
     
     def stop_all_motors(self):
         """Stop all motors."""
         self._ensure_lock_exists()
         with self.lock:
-            for motor in range(4):
-                self.robot.MotorStop(motor)
+            # Zero the duty cycle of every motor channel
+            self.robot.MotorStopAll()
             
             # Update motor state
             self.motor_speeds = [0, 0, 0, 0]
+            self._motor_snapshot = ((0, 0, 0, 0), tuple(self.motor_directions))
             logger.debug("All motors stopped")
     
     def control_camera_gimbal(self, pan, tilt):
@@ -151,40 +154,63 @@ class RobotController:
             pan (float): Pan control value (-1 to 1)
             tilt (float): Tilt control value (-1 to 1)
         """
+        # Calculate new angles based on joystick input
+        # Servo writes are collected so both can go out in one I2C transaction
+        servo_writes = []
+        now = time.monotonic()
+        pan_angle = self.pan_angle
+        tilt_angle = self.tilt_angle
+        new_pan_angle = None
+        new_tilt_angle = None
+        
+        # Pan (horizontal) servo - PWM9
+        # Map from -1:1 to angle range (35° to 125°)
+        if abs(pan) >= self.servo_deadband and now - self._last_pan_write >= self.servo_min_interval:
+            # Calculate new pan angle
+            pan_change = pan * 2  # Adjust sensitivity
+            new_pan_angle = max(35, min(125, pan_angle + pan_change))
+            
+            # Set servo only if the whole-degree angle changed
+            if int(new_pan_angle) != int(pan_angle):
+                servo_writes.append((9, int(new_pan_angle)))
+        
+        # Tilt (vertical) servo - PWM10
+        # Map from -1:1 to angle range (0° to 85°)
+        if abs(tilt) >= self.servo_deadband and now - self._last_tilt_write >= self.servo_min_interval:
+            # Calculate new tilt angle
+            tilt_change = tilt * 2  # Adjust sensitivity
+            new_tilt_angle = max(0, min(85, tilt_angle - tilt_change))  # Invert for intuitive control
+            
+            # Set servo only if the whole-degree angle changed
+            if int(new_tilt_angle) != int(tilt_angle):
+                servo_writes.append((10, int(new_tilt_angle)))
+        
+        if new_pan_angle is None and new_tilt_angle is None:
+            return
+        
+        # Only the I2C writes and the state update need the lock
         self._ensure_lock_exists()
         with self.lock:
-            # Calculate new angles based on joystick input
-            # Pan (horizontal) servo - PWM9
-            # Map from -1:1 to angle range (35° to 125°)
-            if pan != 0:
-                # Calculate new pan angle
-                pan_change = pan * 2  # Adjust sensitivity
-                new_pan_angle = self.pan_angle + pan_change
-                
-                # Ensure within valid range
-                new_pan_angle = max(35, min(125, new_pan_angle))
-                
-                # Set servo if angle changed
-                if new_pan_angle != self.pan_angle:
-                    self.pan_angle = new_pan_angle
-                    self.robot.set_servo_angle(9, int(self.pan_angle))
-                    logger.debug(f"Pan servo set to {self.pan_angle}°")
-            
-            # Tilt (vertical) servo - PWM10
-            # Map from -1:1 to angle range (0° to 85°)
-            if tilt != 0:
-                # Calculate new tilt angle
-                tilt_change = tilt * 2  # Adjust sensitivity
-                new_tilt_angle = self.tilt_angle - tilt_change  # Invert for intuitive control
-                
-                # Ensure within valid range
-                new_tilt_angle = max(0, min(85, new_tilt_angle))
-                
-                # Set servo if angle changed
-                if new_tilt_angle != self.tilt_angle:
-                    self.tilt_angle = new_tilt_angle
-                    self.robot.set_servo_angle(10, int(self.tilt_angle))
-                    logger.debug(f"Tilt servo set to {self.tilt_angle}°")
+            # Write the changed servos
+            if len(servo_writes) > 1:
+                self.robot.set_servo_angles_bulk(servo_writes)
+            elif servo_writes:
+                self.robot.set_servo_angle(*servo_writes[0])
+            
+            # Update servo state
+            for channel, _ in servo_writes:
+                if channel == 9:
+                    self._last_pan_write = now
+                else:
+                    self._last_tilt_write = now
+            if new_pan_angle is not None:
+                self.pan_angle = new_pan_angle
+            if new_tilt_angle is not None:
+                self.tilt_angle = new_tilt_angle
+            self._servo_snapshot = (self.pan_angle, self.tilt_angle)
+        
+        for channel, angle in servo_writes:
+            logger.debug(f"{'Pan' if channel == 9 else 'Tilt'} servo set to {angle}°")
     
     def center_camera(self):
         """Center the camera gimbal to default position."""
@@ -193,10 +219,10 @@ class RobotController:
             # Set default positions
             self.pan_angle = 80
             self.tilt_angle = 40
+            self._servo_snapshot = (self.pan_angle, self.tilt_angle)
             
-            # Set servo angles
-            self.robot.set_servo_angle(9, int(self.pan_angle))
-            self.robot.set_servo_angle(10, int(self.tilt_angle))
+            # Set both servo angles in one I2C transaction
+            self.robot.set_servo_angles_bulk([(9, int(self.pan_angle)), (10, int(self.tilt_angle))])
             
             logger.debug("Camera centered to default position")
     
@@ -207,12 +233,12 @@ class RobotController:
         Returns:
             dict: Dictionary containing motor speeds and directions
         """
-        self._ensure_lock_exists()
-        with self.lock:
-            return {
-                'speeds': self.motor_speeds,
-                'directions': self.motor_directions
-            }
+        # Read the published snapshot without taking the lock
+        speeds, directions = self._motor_snapshot
+        return {
+            'speeds': list(speeds),
+            'directions': list(directions)
+        }
     
     def get_servo_status(self):
         """
@@ -221,9 +247,9 @@ class RobotController:
         Returns:
             dict: Dictionary containing servo angles
         """
-        self._ensure_lock_exists()
-        with self.lock:
-            return {
-                'pan': self.pan_angle,
-                'tilt': self.tilt_angle
-            } 
\ No newline at end of file
+        # Read the published snapshot without taking the lock
+        pan, tilt = self._servo_snapshot
+        return {
+            'pan': pan,
+            'tilt': tilt
+        } 
\ No newline at end of file
@@ -17,10 +17,43 @@ import logging
 import threading
 import numpy as np
 import cv2
+from modules.jit import njit, NUMBA_AVAILABLE
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Radians to degrees conversion factor
+RAD_TO_DEG = 180.0 / math.pi
+
+@njit(cache=True, fastmath=True)
+def _transform_motion(M, scale):
+    """Extract the scaled translation and yaw in degrees from a 2x3 transform."""
+    return M[0, 2] * scale, M[1, 2] * scale, math.atan2(M[1, 0], M[0, 0]) * RAD_TO_DEG
+
+@njit(cache=True)
+def _mark_position(grid, pos_x, pos_y, center_x, center_y, resolution):
+    """Mark a position as occupied and the free cells around it. Returns True if any cell changed."""
+    # Convert position to grid coordinates
+    grid_x = int(center_x + pos_x / resolution)
+    grid_y = int(center_y + pos_y / resolution)
+    size_y, size_x = grid.shape
+    if grid_x < 0 or grid_x >= size_x or grid_y < 0 or grid_y >= size_y:
+        return False
+    
+    # Mark the surrounding 5x5 cells as free space, only where not already occupied
+    changed = False
+    for y in range(max(0, grid_y - 2), min(size_y, grid_y + 3)):
+        for x in range(max(0, grid_x - 2), min(size_x, grid_x + 3)):
+            if grid[y, x] < 50 and grid[y, x] != 0:
+                grid[y, x] = 0
+                changed = True
+    
+    # Mark current position as occupied
+    if grid[grid_y, grid_x] != 100:
+        grid[grid_y, grid_x] = 100
+        changed = True
+    return changed
+
 class SLAMProcessor:
     """
     SLAM processor for visual mapping and localization.
@@ -38,29 +71,56 @@ class SLAMProcessor:
         self.imu = imu
         self.is_running = False
         self.lock = threading.Lock()
+        self.min_frame_interval = 0.2  # Process frames at most at 5Hz
         
         # SLAM state
         self.position = {'x': 0.0, 'y': 0.0, 'z': 0.0}
         self.orientation = {'roll': 0.0, 'pitch': 0.0, 'yaw': 0.0}
-        self.map_points = []
-        self.trajectory = []
+        
+        # Trajectory as a circular buffer of (x, y, z) rows
+        self.max_trajectory = 100
+        self.trajectory_xyz = np.zeros((self.max_trajectory, 3), dtype=np.float32)
+        self._trajectory_idx = 0    # Next slot to write
+        self._trajectory_count = 0  # Number of valid positions
         self.occupancy_grid = None
         
+        # Map points as a circular buffer of (x, y, z) rows
+        self.max_map_points = 1000
+        self.map_points_xyz = np.zeros((self.max_map_points, 3), dtype=np.float32)
+        self._map_point_idx = 0    # Next slot to write
+        self._map_point_count = 0  # Number of valid points
+        
         # Feature tracking
-        self.orb = cv2.ORB_create(nfeatures=500)
+        self.orb = cv2.ORB_create(nfeatures=200, fastThreshold=12, scaleFactor=1.3, nlevels=6)
+        self.min_keypoints = 20  # Skip matching on frames with less texture than this
         self.last_frame = None
+        self._gray_buf = None  # Reused grayscale conversion buffer
+        self._small_buf = None  # Reused downsampled buffer for detection
+        self.feature_scale = 2  # Detect features at 1/feature_scale resolution
         self.last_keypoints = None
+        self.last_points = None  # last_keypoints converted to full-resolution pixels
         self.last_descriptors = None
         
-        # Matcher for feature matching
-        self.matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+        # Matcher for feature matching (k-NN with Lowe's ratio test)
+        self.matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+        self.match_ratio = 0.75
         
         # Initialize occupancy grid (2D map)
         self.grid_size = 100  # 100x100 grid
         self.grid_resolution = 0.1  # 10cm per cell
         self.occupancy_grid = np.zeros((self.grid_size, self.grid_size), dtype=np.int8)
+        self.grid_version = 0  # Incremented whenever the occupancy grid changes
+        self._packed_grid = None  # Cached 2-bit packed grid for clients
+        self._packed_version = -1  # grid_version the packed grid was built from
         self.grid_center = (self.grid_size // 2, self.grid_size // 2)
         
+        # Map colors indexed by cell class: occupied (black), free (white), unknown (gray)
+        self.map_colors = np.array([[0, 0, 0], [255, 255, 255], [128, 128, 128]], dtype=np.uint8)
+        
+        # Orientation arrow end offsets (dx, dy) for each whole degree of yaw
+        yaw_rad = np.radians(np.arange(360))
+        self._arrow_lut = np.floor(np.stack([5 * np.cos(yaw_rad), 5 * np.sin(yaw_rad)], axis=1)).astype(np.int32)
+        
         logger.info("SLAM processor initialized")
     
     def start(self):
@@ -83,17 +143,31 @@ class SLAMProcessor:
     
     def _update_slam(self):
         """Background thread for SLAM processing."""
+        last_frame_id = 0
+        last_process_time = 0.0
         while self.is_running:
             try:
+                # Wait for the camera to signal a new frame instead of polling
+                frame_id = self.camera.wait_for_frame(last_frame_id, timeout=1.0)
+                if frame_id == last_frame_id:
+                    # Timed out, or the camera is stopped and will not signal
+                    if not self.camera.is_running:
+                        time.sleep(0.2)
+                    continue
+                last_frame_id = frame_id
+                
+                # Limit processing to 5Hz, then take the newest frame
+                delay = self.min_frame_interval - (time.monotonic() - last_process_time)
+                if delay > 0:
+                    time.sleep(delay)
+                last_process_time = time.monotonic()
+                
                 # Get current camera frame
                 frame = self.camera.get_frame()
                 
                 if frame is not None:
                     # Process frame for SLAM
                     self._process_frame(frame)
-                
-                # Update at 5Hz
-                time.sleep(0.2)
             except Exception as e:
                 logger.error(f"Error in SLAM processing: {str(e)}")
                 time.sleep(0.5)  # Sleep longer on error
@@ -105,135 +179,188 @@ class SLAMProcessor:
         Args:
             frame: Camera frame to process
         """
-        # Convert to grayscale for feature detection
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        # Convert to grayscale for feature detection, reusing the buffer
+        # (last_frame aliases it; only keypoints/descriptors are kept)
+        if self._gray_buf is None or self._gray_buf.shape != frame.shape[:2]:
+            self._gray_buf = np.empty(frame.shape[:2], dtype=np.uint8)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray_buf)
+        
+        # Downsample before detection; keypoint coordinates are scaled back
+        # to full resolution wherever they are used
+        small_shape = (gray.shape[0] // self.feature_scale, gray.shape[1] // self.feature_scale)
+        if self._small_buf is None or self._small_buf.shape != small_shape:
+            self._small_buf = np.empty(small_shape, dtype=np.uint8)
+        small = cv2.resize(gray, (small_shape[1], small_shape[0]), dst=self._small_buf,
+                           interpolation=cv2.INTER_AREA)
         
         # Detect ORB features
-        keypoints, descriptors = self.orb.detectAndCompute(gray, None)
+        keypoints, descriptors = self.orb.detectAndCompute(small, None)
+        
+        # Skip low-texture frames, keeping the previous frame as the reference
+        if keypoints is None or len(keypoints) < self.min_keypoints:
+            self._update_imu_orientation()
+            return
+        
+        # Convert keypoints to full-resolution pixel coordinates once per frame;
+        # the array is kept as the next frame's source points
+        points = cv2.KeyPoint_convert(keypoints) * self.feature_scale
         
         # If this is the first frame, just store it
         if self.last_frame is None or self.last_keypoints is None or self.last_descriptors is None:
             self.last_frame = gray
             self.last_keypoints = keypoints
+            self.last_points = points
             self.last_descriptors = descriptors
             return
         
         # Match features between frames
         if len(keypoints) > 0 and len(self.last_keypoints) > 0 and descriptors is not None and self.last_descriptors is not None:
-            matches = self.matcher.match(self.last_descriptors, descriptors)
+            knn_matches = self.matcher.knnMatch(self.last_descriptors, descriptors, k=2)
             
-            # Sort matches by distance
-            matches = sorted(matches, key=lambda x: x.distance)
+            # Keep matches that are clearly better than the second-best candidate
+            good_matches = [pair[0] for pair in knn_matches
+                            if len(pair) == 2 and pair[0].distance < self.match_ratio * pair[1].distance]
             
-            # Use only good matches
-            good_matches = matches[:min(30, len(matches))]
+            # Use only the 30 best matches, selected without a full sort
+            if len(good_matches) > 30:
+                distances = np.fromiter((m.distance for m in good_matches), dtype=np.float32, count=len(good_matches))
+                best = np.argpartition(distances, 30)[:30]
+                good_matches = [good_matches[i] for i in best]
             
-            if len(good_matches) >= 8:  # Need at least 8 points for homography
-                # Extract matched keypoints
-                src_pts = np.float32([self.last_keypoints[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-                dst_pts = np.float32([keypoints[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
+            if len(good_matches) >= 8:  # Require enough matches for a stable RANSAC fit
+                # Gather matched keypoints in full-resolution pixels by index
+                query_idx = np.fromiter((m.queryIdx for m in good_matches), dtype=np.int32, count=len(good_matches))
+                train_idx = np.fromiter((m.trainIdx for m in good_matches), dtype=np.int32, count=len(good_matches))
+                src_pts = self.last_points[query_idx].reshape(-1, 1, 2)
+                dst_pts = points[train_idx].reshape(-1, 1, 2)
                 
-                # Calculate homography
-                H, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
+                # Estimate rotation, translation and uniform scale between frames
+                M, inliers = cv2.estimateAffinePartial2D(src_pts, dst_pts, method=cv2.RANSAC,
+                                                         ransacReprojThreshold=5.0)
                 
-                if H is not None:
-                    # Update position based on homography
-                    self._update_position_from_homography(H)
+                if M is not None:
+                    # Update position based on the frame-to-frame transform
+                    self._update_position_from_transform(M)
                     
-                    # Update map with new features
-                    self._update_map(keypoints, good_matches)
-        
-        # Get IMU data for sensor fusion
-        imu_data = self.imu.get_data()
-        orientation = self.imu.get_orientation()
+                    # Update map with the matched features
+                    self._update_map(dst_pts.reshape(-1, 2))
         
         # Update orientation from IMU
-        with self.lock:
-            self.orientation['roll'] = orientation['roll']
-            self.orientation['pitch'] = orientation['pitch']
-            # Yaw is estimated from visual odometry
+        self._update_imu_orientation()
         
         # Store current frame for next iteration
         self.last_frame = gray
         self.last_keypoints = keypoints
+        self.last_points = points
         self.last_descriptors = descriptors
         
-        # Add current position to trajectory
+        # Add current position to trajectory, overwriting the oldest entry
         with self.lock:
-            self.trajectory.append(self.position.copy())
-            
-            # Limit trajectory length
-            if len(self.trajectory) > 100:
-                self.trajectory = self.trajectory[-100:]
+            position = self.position
+            self.trajectory_xyz[self._trajectory_idx] = (position['x'], position['y'], position['z'])
+            self._trajectory_idx = (self._trajectory_idx + 1) % self.max_trajectory
+            self._trajectory_count = min(self._trajectory_count + 1, self.max_trajectory)
     
-    def _update_position_from_homography(self, H):
+    def _update_imu_orientation(self):
+        """Update roll and pitch from the IMU; yaw is estimated from visual odometry."""
+        orientation = self.imu.get_orientation()
+        
+        # Publish a new dict so readers never see a partial update
+        with self.lock:
+            self.orientation = {
+                'roll': orientation['roll'],
+                'pitch': orientation['pitch'],
+                'yaw': self.orientation['yaw']
+            }
+    
+    def _update_position_from_transform(self, M):
         """
-        Update position estimate from homography matrix.
+        Update position estimate from a partial affine transform.
         
         Args:
-            H: Homography matrix
+            M: 2x3 rotation + translation + scale matrix
         """
-        # Extract translation from homography
-        tx = H[0, 2]
-        ty = H[1, 2]
-        
-        # Scale factor (arbitrary for simulation)
-        scale = 0.01
+        # Extract scaled translation and yaw from the transform
+        # (scale factor is arbitrary for simulation)
+        dx, dy, yaw = _transform_motion(M, 0.01)
         
-        # Update position
+        # Update position (publish new dicts so readers never see a partial update)
         with self.lock:
-            self.position['x'] += tx * scale
-            self.position['y'] += ty * scale
-            
-            # Estimate yaw from homography
-            angle = math.atan2(H[1, 0], H[0, 0])
-            self.orientation['yaw'] = angle * 180.0 / math.pi
+            self.position = {
+                'x': self.position['x'] + dx,
+                'y': self.position['y'] + dy,
+                'z': self.position['z']
+            }
+            self.orientation = dict(self.orientation, yaw=yaw)
     
-    def _update_map(self, keypoints, matches):
+    def _update_map(self, pts):
         """
         Update the map with new feature points.
         
         Args:
-            keypoints: Detected keypoints
-            matches: Feature matches
+            pts: (N, 2) matched keypoint coordinates in full-resolution pixels
         """
         # Add new map points
         with self.lock:
-            for m in matches:
-                # Convert keypoint to world coordinates (simplified)
-                kp = keypoints[m.trainIdx]
-                x = self.position['x'] + (kp.pt[0] - 320) * 0.01
-                y = self.position['y'] + (kp.pt[1] - 240) * 0.01
-                
-                # Add to map points
-                self.map_points.append({'x': x, 'y': y, 'z': 0})
-                
-                # Limit number of map points
-                if len(self.map_points) > 1000:
-                    self.map_points = self.map_points[-1000:]
+            # Convert keypoints to world coordinates (simplified)
+            offset = np.array([self.position['x'] - 3.2, self.position['y'] - 2.4], dtype=np.float32)
+            world = pts * 0.01 + offset
+            
+            # Write into the circular buffer, overwriting the oldest points
+            slots = (self._map_point_idx + np.arange(len(pts))) % self.max_map_points
+            self.map_points_xyz[slots, :2] = world
+            self.map_points_xyz[slots, 2] = 0
+            
+            self._map_point_idx = (self._map_point_idx + len(pts)) % self.max_map_points
+            self._map_point_count = min(self._map_point_count + len(pts), self.max_map_points)
             
             # Update occupancy grid
             self._update_occupancy_grid()
     
     def _update_occupancy_grid(self):
         """Update the 2D occupancy grid map."""
+        if NUMBA_AVAILABLE:
+            if _mark_position(self.occupancy_grid, self.position['x'], self.position['y'],
+                              self.grid_center[0], self.grid_center[1], self.grid_resolution):
+                self.grid_version += 1
+            return
+        
         # Convert robot position to grid coordinates
         grid_x = int(self.grid_center[0] + self.position['x'] / self.grid_resolution)
         grid_y = int(self.grid_center[1] + self.position['y'] / self.grid_resolution)
         
         # Ensure within grid bounds
         if 0 <= grid_x < self.grid_size and 0 <= grid_y < self.grid_size:
+            # Mark the surrounding 5x5 cells as free space (clipped to the grid),
+            # only where not already occupied
+            y0, y1 = max(0, grid_y - 2), min(self.grid_size, grid_y + 3)
+            x0, x1 = max(0, grid_x - 2), min(self.grid_size, grid_x + 3)
+            region = self.occupancy_grid[y0:y1, x0:x1]
+            to_free = (region < 50) & (region != 0)
+            changed = bool(to_free.any())
+            region[to_free] = 0
+            
             # Mark current position as occupied
-            self.occupancy_grid[grid_y, grid_x] = 100
+            if self.occupancy_grid[grid_y, grid_x] != 100:
+                self.occupancy_grid[grid_y, grid_x] = 100
+                changed = True
             
-            # Mark surrounding cells as free space
-            for dx in range(-2, 3):
-                for dy in range(-2, 3):
-                    nx, ny = grid_x + dx, grid_y + dy
-                    if 0 <= nx < self.grid_size and 0 <= ny < self.grid_size and (dx != 0 or dy != 0):
-                        # Only mark as free if not already occupied
-                        if self.occupancy_grid[ny, nx] < 50:
-                            self.occupancy_grid[ny, nx] = 0
+            # Only bump the version when a cell actually changed, so clients
+            # and the packed-grid cache are not refreshed for a stationary robot
+            if changed:
+                self.grid_version += 1
+    
+    def _classify_grid(self):
+        """
+        Classify occupancy grid cells. Must be called with the lock held.
+        
+        Returns:
+            numpy.ndarray: uint8 grid of occupied (0), free (1) and unknown (2) cells
+        """
+        cell_class = np.full(self.occupancy_grid.shape, 2, dtype=np.uint8)
+        cell_class[self.occupancy_grid == 0] = 1
+        cell_class[self.occupancy_grid > 50] = 0
+        return cell_class
     
     def get_data(self):
         """
@@ -242,15 +369,94 @@ class SLAMProcessor:
         Returns:
             dict: SLAM data including position, orientation, and map
         """
+        data = self.get_state()
+        data['occupancy_grid'] = self.get_occupancy_grid()
+        return data
+    
+    def get_state(self):
+        """
+        Get current SLAM state without copying the occupancy grid.
+        
+        Returns:
+            dict: Position, orientation, trajectory, map size and grid version
+        """
         with self.lock:
             return {
                 'position': self.position.copy(),
                 'orientation': self.orientation.copy(),
-                'trajectory': self.trajectory.copy(),
-                'map_size': len(self.map_points),
-                'occupancy_grid': self.occupancy_grid.copy()
+                'trajectory': self._ordered_trajectory().tolist(),
+                'map_size': self._map_point_count,
+                'grid_version': self.grid_version
             }
     
+    def get_occupancy_grid(self):
+        """
+        Get a copy of the occupancy grid.
+        
+        Returns:
+            numpy.ndarray: Occupancy grid (grid_size x grid_size)
+        """
+        with self.lock:
+            return self.occupancy_grid.copy()
+    
+    def get_occupancy_packed(self):
+        """
+        Get the occupancy grid packed to 2 bits per cell for clients.
+        
+        Cells are classified as occupied (0), free (1) or unknown (2) and packed
+        four per byte in row-major order, first cell in the two most significant bits.
+        The packed grid is cached until the occupancy grid changes.
+        
+        Returns:
+            bytes: Packed occupancy grid (grid_size * grid_size / 4 bytes)
+        """
+        with self.lock:
+            if self._packed_version != self.grid_version:
+                classes = self._classify_grid().ravel()
+                
+                # Pad with unknown cells to a multiple of four
+                classes = np.pad(classes, (0, -classes.size % 4), constant_values=2)
+                
+                # Shift each cell into its bit pair and combine four cells per byte
+                shifted = classes.reshape(-1, 4) << np.array([6, 4, 2, 0], dtype=np.uint8)
+                self._packed_grid = np.bitwise_or.reduce(shifted, axis=1).tobytes()
+                self._packed_version = self.grid_version
+            
+            return self._packed_grid
+    
+    def get_map_points(self):
+        """
+        Get the current map points, oldest first.
+        
+        Returns:
+            numpy.ndarray: (N, 3) array of x, y, z map point coordinates
+        """
+        with self.lock:
+            if self._map_point_count < self.max_map_points:
+                return self.map_points_xyz[:self._map_point_count].copy()
+            return np.roll(self.map_points_xyz, -self._map_point_idx, axis=0)
+    
+    def get_trajectory(self):
+        """
+        Get the recent trajectory, oldest first.
+        
+        Returns:
+            numpy.ndarray: (N, 3) array of x, y, z positions
+        """
+        with self.lock:
+            return self._ordered_trajectory().copy()
+    
+    def _ordered_trajectory(self):
+        """
+        Get the trajectory buffer in chronological order. Must be called with the lock held.
+        
+        Returns:
+            numpy.ndarray: (N, 3) view or copy of the trajectory buffer
+        """
+        if self._trajectory_count < self.max_trajectory:
+            return self.trajectory_xyz[:self._trajectory_count]
+        return np.roll(self.trajectory_xyz, -self._trajectory_idx, axis=0)
+    
     def get_position(self):
         """
         Get current position estimate.
@@ -258,8 +464,8 @@ class SLAMProcessor:
         Returns:
             dict: Position coordinates
         """
-        with self.lock:
-            return self.position.copy()
+        # The dict is replaced, never mutated, so no lock is needed
+        return self.position.copy()
     
     def get_orientation(self):
         """
@@ -268,8 +474,8 @@ class SLAMProcessor:
         Returns:
             dict: Orientation angles
         """
-        with self.lock:
-            return self.orientation.copy()
+        # The dict is replaced, never mutated, so no lock is needed
+        return self.orientation.copy()
     
     def get_map_visualization(self, width=320, height=320):
         """
@@ -283,21 +489,8 @@ class SLAMProcessor:
             numpy.ndarray: Map visualization image
         """
         with self.lock:
-            # Create visualization image
-            vis_map = np.zeros((self.grid_size, self.grid_size, 3), dtype=np.uint8)
-            
-            # Draw occupancy grid
-            for y in range(self.grid_size):
-                for x in range(self.grid_size):
-                    if self.occupancy_grid[y, x] > 50:
-                        # Occupied cell (black)
-                        vis_map[y, x] = [0, 0, 0]
-                    elif self.occupancy_grid[y, x] == 0:
-                        # Free space (white)
-                        vis_map[y, x] = [255, 255, 255]
-                    else:
-                        # Unknown (gray)
-                        vis_map[y, x] = [128, 128, 128]
+            # Draw occupancy grid by looking up each cell class's color
+            vis_map = self.map_colors[self._classify_grid()]
             
             # Draw robot position
             robot_x = int(self.grid_center[0] + self.position['x'] / self.grid_resolution)
@@ -308,22 +501,17 @@ class SLAMProcessor:
                 cv2.circle(vis_map, (robot_x, robot_y), 2, (0, 0, 255), -1)
                 
                 # Draw orientation line
-                yaw_rad = self.orientation['yaw'] * math.pi / 180.0
-                end_x = int(robot_x + 5 * math.cos(yaw_rad))
-                end_y = int(robot_y + 5 * math.sin(yaw_rad))
-                cv2.line(vis_map, (robot_x, robot_y), (end_x, end_y), (0, 255, 0), 1)
+                dx, dy = self._arrow_lut[int(self.orientation['yaw']) % 360]
+                cv2.line(vis_map, (robot_x, robot_y), (robot_x + int(dx), robot_y + int(dy)), (0, 255, 0), 1)
             
-            # Draw trajectory
-            points = []
-            for pos in self.trajectory:
-                tx = int(self.grid_center[0] + pos['x'] / self.grid_resolution)
-                ty = int(self.grid_center[1] + pos['y'] / self.grid_resolution)
-                if 0 <= tx < self.grid_size and 0 <= ty < self.grid_size:
-                    points.append((tx, ty))
+            # Draw trajectory, converting all positions to grid coordinates at once
+            grid_pts = (np.asarray(self.grid_center) + self._ordered_trajectory()[:, :2] / self.grid_resolution).astype(np.int32)
+            inside = np.all((grid_pts >= 0) & (grid_pts < self.grid_size), axis=1)
+            points = grid_pts[inside].reshape(-1, 1, 2)
             
+            # Draw all segments in a single call
             if len(points) > 1:
-                for i in range(1, len(points)):
-                    cv2.line(vis_map, points[i-1], points[i], (255, 0, 0), 1)
+                cv2.polylines(vis_map, [points], False, (255, 0, 0), 1)
             
             # Resize to requested dimensions
             if vis_map.shape[0] != height or vis_map.shape[1] != width:
@@ -25,6 +25,7 @@ const emergencyStopButton = document.getElementById('emergency-stop');
 // SLAM state
 let slamActive = false;
 let mapVisible = false;
+let lastGridVersion = null;
 
 // Initialize the application
 document.addEventListener('DOMContentLoaded', () => {
@@ -48,6 +49,11 @@ function initSocketConnection() {
         connectionStatus.classList.add('connected');
         statusText.textContent = 'Connected';
         console.log('Connected to server');
+        
+        // The map is only pushed when it changes, so fetch it after (re)connecting
+        if (mapVisible) {
+            socket.emit('request_map');
+        }
     });
 
     socket.on('disconnect', () => {
@@ -58,6 +64,8 @@ function initSocketConnection() {
     });
 
     // Data events
+    socket.on('tick', handleTick);
+    socket.on('map_data', handleMapData);
     socket.on('sensor_data', handleSensorData);
     socket.on('status_update', handleStatusUpdate);
     socket.on('error', handleError);
@@ -133,6 +141,7 @@ function initButtonHandlers() {
     toggleMapButton.addEventListener('click', () => {
         mapVisible = !mapVisible;
         if (mapVisible) {
+            socket.emit('request_map');  // Fetch the current map for the first draw
             mapOverlay.classList.add('visible');
             toggleMapButton.textContent = 'Hide Map';
         } else {
@@ -171,6 +180,14 @@ function initMapCanvas() {
     ctx.fillText('Map will appear here', mapCanvas.width / 2, mapCanvas.height / 2);
 }
 
+// Handle periodic updates carrying both sensor data and system status
+function handleTick(data) {
+    handleSensorData(data);
+    if (data.status) {
+        handleStatusUpdate(data.status);
+    }
+}
+
 // Handle sensor data from server
 function handleSensorData(data) {
     // Update IMU data
@@ -214,26 +231,48 @@ function handleSensorData(data) {
         pitch.textContent = data.slam.orientation.pitch.toFixed(2);
         yaw.textContent = data.slam.orientation.yaw.toFixed(2);
         
-        // Update map if visible
-        if (mapVisible && data.slam.occupancy_grid) {
-            updateMapCanvas(data.slam.occupancy_grid);
+        // Update map if visible; the packed grid is only attached on ticks where it changed
+        if (mapVisible && data.slam.occupancy_packed && data.slam.grid_version !== lastGridVersion) {
+            handleMapData(data.slam);
         }
     }
 }
 
 // Handle status updates from server
 function handleStatusUpdate(data) {
-    // Update system status indicators
-    document.getElementById('camera-status').textContent = data.camera_active ? 'Active' : 'Inactive';
-    document.getElementById('imu-status').textContent = data.imu_calibrated ? 'Calibrated' : 'Not Calibrated';
-    document.getElementById('slam-status').textContent = data.slam_active ? 'Active' : 'Inactive';
-    document.getElementById('cpu-usage').textContent = `${data.cpu_usage}%`;
-    document.getElementById('memory-usage').textContent = `${data.memory_usage}%`;
-    document.getElementById('battery-level').textContent = `${data.battery_level}%`;
+    // Update system status indicators (updates may only carry changed fields)
+    if ('camera_active' in data) {
+        document.getElementById('camera-status').textContent = data.camera_active ? 'Active' : 'Inactive';
+    }
+    if ('imu_calibrated' in data) {
+        document.getElementById('imu-status').textContent = data.imu_calibrated ? 'Calibrated' : 'Not Calibrated';
+    }
+    if ('cpu_usage' in data) {
+        document.getElementById('cpu-usage').textContent = `${data.cpu_usage}%`;
+    }
+    if ('memory_usage' in data) {
+        document.getElementById('memory-usage').textContent = `${data.memory_usage}%`;
+    }
+    if ('battery_level' in data) {
+        document.getElementById('battery-level').textContent = `${data.battery_level}%`;
+    }
     
-    // Update SLAM button state
-    slamActive = data.slam_active;
-    toggleSlamButton.textContent = slamActive ? 'Disable SLAM' : 'Enable SLAM';
+    if ('slam_active' in data) {
+        document.getElementById('slam-status').textContent = data.slam_active ? 'Active' : 'Inactive';
+        
+        // Update SLAM button state
+        slamActive = data.slam_active;
+        toggleSlamButton.textContent = slamActive ? 'Disable SLAM' : 'Enable SLAM';
+    }
+}
+
+// Handle a packed occupancy grid sent by the server
+function handleMapData(data) {
+    if (!mapVisible) {
+        return;
+    }
+    lastGridVersion = data.grid_version;
+    updateMapCanvas(data.occupancy_packed);
 }
 
 // Handle error messages from server
@@ -243,6 +282,7 @@ function handleError(data) {
 }
 
 // Update the map canvas with occupancy grid data
+// (2 bits per cell, four cells per byte; only sent when the grid changed)
 function updateMapCanvas(gridData) {
     // This is a placeholder - in a real implementation, 
     // we would render the occupancy grid data to the canvas
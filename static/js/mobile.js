@@ -29,6 +29,7 @@ const posYValue = document.getElementById('pos-y-value');
 // SLAM state
 let slamActive = false;
 let mapVisible = false;
+let lastGridVersion = null;
 
 // Initialize the application
 document.addEventListener('DOMContentLoaded', () => {
@@ -65,6 +66,11 @@ function initSocketConnection() {
         connectionStatus.classList.add('connected');
         statusText.textContent = 'Connected';
         console.log('Connected to server');
+        
+        // The map is only pushed when it changes, so fetch it after (re)connecting
+        if (mapVisible) {
+            socket.emit('request_map');
+        }
     });
 
     socket.on('disconnect', () => {
@@ -75,6 +81,8 @@ function initSocketConnection() {
     });
 
     // Data events
+    socket.on('tick', handleTick);
+    socket.on('map_data', handleMapData);
     socket.on('sensor_data', handleSensorData);
     socket.on('status_update', handleStatusUpdate);
     socket.on('error', handleError);
@@ -135,6 +143,7 @@ function initButtonHandlers() {
     toggleMapButton.addEventListener('click', () => {
         mapVisible = !mapVisible;
         if (mapVisible) {
+            socket.emit('request_map');  // Fetch the current map for the first draw
             mapOverlay.classList.remove('hidden');
         } else {
             mapOverlay.classList.add('hidden');
@@ -185,6 +194,14 @@ function initMapCanvas() {
     ctx.fillText('Map', mapCanvas.width / 2, mapCanvas.height / 2);
 }
 
+// Handle periodic updates carrying both sensor data and system status
+function handleTick(data) {
+    handleSensorData(data);
+    if (data.status) {
+        handleStatusUpdate(data.status);
+    }
+}
+
 // Handle sensor data from server
 function handleSensorData(data) {
     // Update IMU data
@@ -200,18 +217,30 @@ function handleSensorData(data) {
         posXValue.textContent = data.slam.position.x.toFixed(1);
         posYValue.textContent = data.slam.position.y.toFixed(1);
         
-        // Update map if visible
-        if (mapVisible && data.slam.occupancy_grid) {
-            updateMapCanvas(data.slam.occupancy_grid);
+        // Update map if visible; the packed grid is only attached on ticks where it changed
+        if (mapVisible && data.slam.occupancy_packed && data.slam.grid_version !== lastGridVersion) {
+            handleMapData(data.slam);
         }
     }
 }
 
 // Handle status updates from server
 function handleStatusUpdate(data) {
-    // Update SLAM button state
-    slamActive = data.slam_active;
-    toggleSlamButton.classList.toggle('active', slamActive);
+    // Updates may only carry changed fields
+    if ('slam_active' in data) {
+        // Update SLAM button state
+        slamActive = data.slam_active;
+        toggleSlamButton.classList.toggle('active', slamActive);
+    }
+}
+
+// Handle a packed occupancy grid sent by the server
+function handleMapData(data) {
+    if (!mapVisible) {
+        return;
+    }
+    lastGridVersion = data.grid_version;
+    updateMapCanvas(data.occupancy_packed);
 }
 
 // Handle error messages from server
@@ -221,6 +250,7 @@ function handleError(data) {
 }
 
 // Update the map canvas with occupancy grid data
+// (2 bits per cell, four cells per byte; only sent when the grid changed)
 function updateMapCanvas(gridData) {
     // This is a simplified visualization
     const ctx = mapCanvas.getContext('2d');